@@ -1,11 +1,9 @@
 import numpy as np
-import scipy.sparse.linalg
 import scipy.linalg
-from ncon import ncon
 import time
 from typing import Union
 
-from .tensors import Tensors, Methods
+from .tensors import Methods, cached_tensors
 
 norm = Methods.normalize
 symm = Methods.symmetrize
@@ -30,6 +28,9 @@ class CtmAlg:
     edge tensor respectively of shapes (chi, chi) and (chi, chi, d). If boundary
     conditions is true, the tensors are overwritten by the initial bc tensors.
     If only one of the two is given, the other will be random initialized.
+    `dtype` (np.dtype): Floating point type of the tensors used in the iterations.
+    Single precision (np.float32) halves the memory traffic at large chi, at the
+    cost of a lower attainable tolerance (~1e-6).
     """
 
     def __init__(
@@ -43,8 +44,9 @@ class CtmAlg:
         chi=2,
         C_init=None,
         T_init=None,
+        dtype=np.float64,
     ):
-        self.tensors = Tensors(beta, model, coupling, h)
+        self.tensors = cached_tensors(beta, model, coupling, h)
         self.d = self.tensors.d
         self.beta = beta
         self.b_c = b_c
@@ -54,13 +56,36 @@ class CtmAlg:
         self.C, self.T, self.T_fixed = self.init_tensors(
             C_init=C_init, T_init=T_init, fixed=fixed
         )
-        self.a = self.tensors.a()
+
+        # Only cast the tensors that are used in the iterations, the remaining
+        # tensors are only used for the (post) properties.
+        self.dtype = dtype
+        self.C, self.T = (x.astype(dtype) for x in (self.C, self.T))
+        if self.T_fixed is not None:
+            self.T_fixed = self.T_fixed.astype(dtype)
+        self.max_chi = chi
+        self.set_beta(beta)
+
+    def set_beta(self, beta: float):
+        """
+        Set the inverse temperature of the system, which only changes the a and b
+        tensors, and reset the iteration count. The current corner and edge
+        tensors are kept, such that they are the initial tensors of the next
+        execution.
+
+        `beta` (float): Equivalent to the inverse of the temperature.
+        """
+        t = self.tensors
+        self.tensors = cached_tensors(beta, t.model, t.coupling, t.h)
+        self.beta = beta
+        self.a = self.tensors.a().astype(self.dtype)
         self.b = self.tensors.b()
         self.b_fixed = self.tensors.b(adj=True)
         self.a_fixed = self.tensors.a(adj=True)
-        self.sv_sums = [0]
+        self._sv_last = 0.0
+        self._steps = 0
+        self.n_iter = 0
         self.exe_time = None
-        self.max_chi = chi
 
     def init_tensors(
         self, fixed=False, C_init=None, T_init=None
@@ -114,41 +139,45 @@ class CtmAlg:
             # Use `M` to compute the renormalization tensor
             U, s = self.new_U(M, trunc)
 
-            # Normalize and symmetrize the new corner and edge tensors
-            self.C = symm(norm(self.new_C(U)))
-            self.T = symm(norm(self.new_T(U)))
+            # Normalize (in place) and symmetrize the new corner and edge tensors
+            C, T = self.new_C(U, M), self.new_T(U)
+            self.C = symm(norm(C, out=C))
+            self.T = symm(norm(T, out=T))
 
             # Keep track of edge tensor with fixed spins if given.
             if self.T_fixed is not None:
-                self.T_fixed = symm(norm(self.new_T(U, fixed=True)))
-
-            # Save sum of singular values
-            self.sv_sums.append(np.sum(s))
+                T_fixed = self.new_T(U, fixed=True)
+                self.T_fixed = symm(norm(T_fixed, out=T_fixed))
 
-            tol_counter += 1 if abs(self.sv_sums[-1] - self.sv_sums[-2]) < tol else 0
+            # Compare the sum of singular values with the one of the previous step.
+            sv_sum = float(np.sum(s))
+            tol_counter += 1 if abs(sv_sum - self._sv_last) < tol else 0
+            self._sv_last = sv_sum
+            self._steps += 1
 
             if tol_counter == count:
                 break
 
-        # Save the computational time and number of iterations
-        self.n_iter = len(self.sv_sums)
+        # Save the computational time and number of iterations. The count includes
+        # the initial sum of zero, to stay consistent with the existing data.
+        self.n_iter = self._steps + 1
         self.exe_time = time.time() - start
 
-    def new_C(self, U: np.ndarray) -> np.ndarray:
+    def new_C(self, U: np.ndarray, M: np.ndarray) -> np.ndarray:
         """
-        Insert an `a` tensor and evaluate a corner matrix `new_M` by contracting
-        the new corner. Renormalized the new corner with the given `U` matrix.
+        Renormalize the contracted corner `M` with the given `U` matrix to
+        obtain the new corner tensor.
 
         `U` (np.ndarray): The renormalization tensor of shape (chi, d, chi).
+        `M` (np.ndarray): The contracted corner with the inserted `a` tensor,
+        as returned by `new_M`, of shape (chi, d, chi, d).
 
         Returns an array of the new corner tensor of shape (chi, chi)
         """
-        return np.array(
-            ncon(
-                [U, self.new_M(), U],
-                ([-1, 2, 1], [1, 2, 3, 4], [-2, 4, 3]),
-            )
-        )
+        # As matrices this is U^T M U, with U.T of shape (chi, d, chi_new).
+        chi, d, _, _ = M.shape
+        U = U.T.reshape(chi * d, -1)
+        return np.asarray(U.T @ M.reshape(chi * d, chi * d) @ U)
 
     def new_M(self) -> np.ndarray:
         """
@@ -157,11 +186,19 @@ class CtmAlg:
 
         Returns a array of the contracted corner of shape (chi, d, chi, d).
         """
-        return np.array(
-            ncon(
-                [self.C, self.T, self.T, self.a],
-                ([1, 2], [-1, 1, 3], [2, -3, 4], [-2, 3, 4, -4]),
-            )
+        # Contract the corner with both edges, then insert the `a` tensor and
+        # transpose to the (chi, d, chi, d) layout. The contractions are written
+        # as plain matrix products, which avoids the Python overhead of
+        # np.tensordot that dominates at small chi. The result is made
+        # contiguous once, so reshaping it to a matrix in `new_U` is a view.
+        chi, d = self.chi, self.d
+        X = np.matmul(np.transpose(self.T, (0, 2, 1)), self.C)
+        X = X.reshape(chi * d, chi) @ self.T.reshape(chi, chi * d)
+        X = np.transpose(X.reshape(chi, d, chi, d), (0, 2, 1, 3))
+        a = np.transpose(self.a, (1, 2, 0, 3)).reshape(d * d, d * d)
+        X = X.reshape(chi * chi, d * d) @ a
+        return np.ascontiguousarray(
+            np.transpose(X.reshape(chi, chi, d, d), (0, 2, 1, 3))
         )
 
     def new_T(self, U: np.ndarray, fixed=False) -> np.ndarray:
@@ -176,21 +213,26 @@ class CtmAlg:
         Returns an array of the new edge tensor of shape (chi, chi, d).
         """
         T = self.T_fixed if fixed else self.T
-        M = ncon([T, self.a], ([-1, -2, 1], [1, -3, -4, -5]))
-        return np.array(
-            ncon(
-                [U, M, U],
-                ([-1, 3, 1], [1, 2, 3, 4, -3], [-2, 4, 2]),
-            )
-        )
+        if T is None:
+            raise ValueError("No fixed edge tensor, the CtmAlg requires `fixed=True`.")
+        chi_new, d, chi = U.shape
+        # Contract `U` with the edge, then insert the `a` tensor and contract
+        # with the second `U`, all as plain matrix products.
+        X = U.reshape(chi_new * d, chi) @ T.reshape(chi, chi * d)
+        X = np.transpose(X.reshape(chi_new, d, chi, d), (0, 2, 1, 3))
+        a = np.transpose(self.a, (1, 0, 2, 3)).reshape(d * d, d * d)
+        X = X.reshape(chi_new * chi, d * d) @ a
+        X = np.transpose(X.reshape(chi_new, chi, d, d), (0, 3, 1, 2))
+        X = X.reshape(chi_new * d, chi * d) @ U.T.reshape(chi * d, chi_new)
+        return np.transpose(X.reshape(chi_new, d, chi_new), (0, 2, 1))
 
     def new_U(self, M: np.ndarray, trunc=True) -> tuple[np.ndarray, np.ndarray]:
         """
-        Return a tuple of the truncated `U` tensor and `s` matrix, by conducting a
-        singular value decomposition (svd) on the given corner tensor `M`. Using
-        this factorization `M` can be written as M = U s V*, where the `U` matrix
-        is used for renormalization and the `s` matrix contains the singular
-        values in descending order.
+        Return a tuple of the truncated `U` tensor and `s` matrix, by conducting an
+        eigenvalue decomposition on the given corner tensor `M`. The reshaped `M` is
+        a symmetric matrix, so its singular value decomposition M = U s V* follows
+        from M = U w U*, with s = |w|. The `U` matrix is used for renormalization
+        and the `s` matrix contains the singular values in descending order.
 
         `M` (np.array): The new contracted corner tensor of shape (chi, d, chi, d).
         `trunc` (bool): If trunc is True, the `U` and `s` matrices are truncated,
@@ -201,19 +243,27 @@ class CtmAlg:
         `U` in a rank-3 tensor and transposing.
         """
 
-        # Reshape M in a matrix
+        # Reshape M in a matrix (no copy, `new_M` returns a contiguous array).
         M = np.reshape(M, (self.chi * self.d, self.chi * self.d))
         k = self.chi
 
+        # M is symmetric, so eigh (which only reads one triangle of M) gives the
+        # singular vectors at about half the cost of an svd. The divide and conquer
+        # driver is the fastest for the full spectrum, which is needed since M is
+        # not guaranteed to be positive definite: sort the eigenpairs on magnitude.
+        # `M` is used again in `new_C`, so it is not overwritten.
+        w, U = scipy.linalg.eigh(M, check_finite=False, driver="evd")
+        order = np.argsort(np.abs(w))[::-1]
+        s, U = np.abs(w[order]), U[:, order]
+
         if trunc:
-            # Get the chi largest singular values and corresponding singular vector matrix.
+            # Keep the chi largest singular values and corresponding singular vectors.
             # Truncate down to the desired chi value, if not yet reached.
             self.chi = self.max_chi
-            U, s, _ = scipy.sparse.linalg.svds(M, k=self.chi, which="LM")
+            U, s = U[:, : self.chi], s[: self.chi]
         else:
             # Also increase chi when using the untruncated U.
             self.chi *= self.d
-            U, s, _ = scipy.linalg.svd(M)
 
         # Reshape U back in a three legged tensor and transpose. Normalize the singular values.
         return np.reshape(U, (k, self.d, self.chi)).T, norm(s)
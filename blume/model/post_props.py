@@ -1,11 +1,11 @@
 import numpy as np
-from ncon import ncon
-import scipy.linalg
+import opt_einsum as oe
+import functools
 import scipy.sparse.linalg
-from typing import Callable
+from typing import Callable, Union
+from opt_einsum.contract import ContractExpression
 
-
-PropFunction = Callable[[dict], float]
+PropFunction = Callable[[dict], Union[float, np.ndarray]]
 
 
 def unpack(data: dict):
@@ -21,151 +21,187 @@ def unpack(data: dict):
     )
 
 
+# Einstein summation subscripts of the tensor networks, the ellipsis allows for a
+# leading batch axis.
+ENVIRONMENT = "...ab,...adc,...bhg,...de,...hl,...ejf,...kli,...jk->...cfgi"
+CORNER = "...ab,...iac,...bkd,...jcdl->...ijkl"
+RING = "...cg,...ghd,...hif,...ie->...cdfe"
+TWO_CORNERS = "...abcd,...abef,...cdfe->..."
+FOUR_CORNERS = "...ab,...ac,...cd,...db->..."
+HALF_RING = "...ab,...ac,...bed,...cfd,...eg,...fg->..."
+
+# Optimal contraction paths of the networks above. The optimal path is the same for
+# every chi, d and batch size (checked in `test_paths`), so it does not have to be
+# searched at runtime.
+PATHS = {
+    ENVIRONMENT: [(0, 1), (0, 2), (0, 1), (0, 1), (0, 1), (0, 1), (0, 1)],
+    CORNER: [(0, 1), (0, 2), (0, 1)],
+    RING: [(0, 1), (0, 1), (0, 1)],
+    TWO_CORNERS: [(0, 1), (0, 1)],
+    FOUR_CORNERS: [(0, 1), (0, 1), (0, 1)],
+    HALF_RING: [(0, 1), (0, 4), (0, 3), (0, 2), (0, 1)],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def expression(subscripts: str, *shapes: tuple[int, ...]) -> ContractExpression:
+    """
+    Return the contraction expression for the given subscripts and operand shapes.
+    Networks without a hardcoded path in `PATHS` get their (optimal) contraction
+    path computed the first time.
+    """
+    path = PATHS.get(subscripts, "dp")
+    return oe.contract_expression(subscripts, *shapes, optimize=path)
+
+
+def contract(subscripts: str, *operands: np.ndarray) -> np.ndarray:
+    """
+    Contract the operands according to the Einstein summation subscripts,
+    reusing the contraction path of earlier calls with the same shapes.
+    """
+    return np.asarray(expression(subscripts, *(x.shape for x in operands))(*operands))
+
+
+def environment(C: np.ndarray, T: np.ndarray, T_first=None) -> np.ndarray:
+    """
+    Return the environment of the center site, i.e. the contraction of the four
+    corners and four edges with the four legs of the center site left open. Only
+    the `a` or `b` tensor has to be contracted with it to obtain a network.
+
+    `T_first` (np.ndarray | None): Optional edge tensor to use for the first edge,
+    e.g. the edge with a fixed spin.
+    """
+    T_first = T if T_first is None else T_first
+    return contract(ENVIRONMENT, C, T_first, T, C, C, T, T, C)
+
+
+# Matrices up to this size (chi = 24 for the transfer matrix) are diagonalized with
+# a dense eigensolver, beyond that ARPACK is faster.
+DENSE_EIGH_MAX_SIZE = 576
+
+
+def largest_eigvals(M: np.ndarray, k=2) -> np.ndarray:
+    """
+    Return the `k` largest eigenvalues, in ascending order, of a symmetric matrix
+    or a batch of symmetric matrices. For large matrices only the `k` eigenvalues
+    are computed with ARPACK instead of the full spectrum.
+    """
+    n = M.shape[-1]
+    if n <= DENSE_EIGH_MAX_SIZE:
+        return np.asarray(np.linalg.eigvalsh(M)[..., -k:])
+
+    w = [
+        scipy.sparse.linalg.eigsh(m, k=k, which="LA", return_eigenvectors=False)
+        for m in M.reshape(-1, n, n)
+    ]
+    return np.sort(w, axis=-1).reshape(*M.shape[:-2], k)
+
+
+def value(x) -> Union[float, np.ndarray]:
+    """
+    Return a float for a single dataset and an array for a batch of datasets.
+    """
+    x = np.asarray(x)
+    return float(x) if x.ndim == 0 else x
+
+
 class Prop:
     """
     Class for post CTM algorithm calculations of thermodynamic properties,
     using the converged corner and edge tensor.
+
+    All tensors in `data` may carry an extra leading (batch) axis, e.g. one entry
+    per temperature, in which case an array with the property of every dataset
+    is returned. The whole batch is then evaluated in a single contraction.
     """
 
     @staticmethod
-    def Z(data: dict) -> float:
+    def Z(data: dict) -> Union[float, np.ndarray]:
         """
         Return the value for the partition function of the system.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        return float(
-            ncon(
-                [C, T, T, C, a, C, T, T, C],
-                (
-                    [1, 2],
-                    [1, 4, 3],
-                    [2, 8, 7],
-                    [4, 5],
-                    [3, 6, 7, 9],
-                    [8, 12],
-                    [5, 10, 6],
-                    [11, 12, 9],
-                    [10, 11],
-                ),
-            )
-        )
+        return value(contract("...cfgi,...cfgi->...", environment(C, T), a))
 
     @staticmethod
-    def m(data: dict) -> float:
+    def m(data: dict) -> Union[float, np.ndarray]:
         """
         Return the value for the magnetization of the system.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        return abs(
-            float(
-                ncon(
-                    [C, T, T, C, b, C, T, T, C],
-                    (
-                        [1, 2],
-                        [1, 4, 3],
-                        [2, 8, 7],
-                        [4, 5],
-                        [3, 6, 7, 9],
-                        [8, 12],
-                        [5, 10, 6],
-                        [11, 12, 9],
-                        [10, 11],
-                    ),
-                )
-                / Prop.Z(data)
-            )
-        )
+        # Contract the same environment with `b` (numerator) and `a` (Z).
+        env = environment(C, T)
+        num = contract("...cfgi,...cfgi->...", env, b)
+        Z = contract("...cfgi,...cfgi->...", env, a)
+        return value(np.abs(num / Z))
 
     @staticmethod
-    def f(data: dict) -> float:
+    def f(data: dict) -> Union[float, np.ndarray]:
         """
         Return the free energy of the system.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        corners = ncon([C, C, C, C], ([1, 2], [1, 3], [3, 4], [4, 2]))
-        denom = (
-            ncon(
-                [C, C, T, T, C, C],
-                ([1, 2], [1, 3], [2, 5, 4], [3, 6, 4], [5, 7], [6, 7]),
-            )
-        ) ** 2
-        return float(-(1 / beta) * np.log(Prop.Z(data) * corners / denom))
+        corners = contract(FOUR_CORNERS, C, C, C, C)
+        denom = contract(HALF_RING, C, C, T, T, C, C) ** 2
+        return value(-(1 / beta) * np.log(Prop.Z(data) * corners / denom))
 
     @staticmethod
-    def Es(data: dict) -> float:
+    def Es(data: dict) -> Union[float, np.ndarray]:
         """
         Return the energy per site of the system.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        a_corner = ncon(
-            [C, T, T, a],
-            ([1, 2], [-1, 1, 3], [2, -3, 4], [-2, 3, 4, -4]),
-        )
-        denom = ncon(
-            [a_corner, a_corner, C, T, T, C],
-            ([1, 2, 3, 4], [1, 2, 5, 6], [3, 7], [7, 8, 4], [8, 9, 6], [9, 5]),
-        )
-        b_corner = ncon(
-            [C, T, T, b],
-            ([1, 2], [-1, 1, 3], [2, -3, 4], [-2, 3, 4, -4]),
-        )
-        num = ncon(
-            [b_corner, b_corner, C, T, T, C],
-            ([1, 2, 3, 4], [1, 2, 5, 6], [3, 7], [7, 8, 4], [8, 9, 6], [9, 5]),
-        )
-
-        return -float(num / denom) * 2
+        # The ring of two corners and two edges closing both networks is the same.
+        ring = contract(RING, C, T, T, C)
+        a_corner = contract(CORNER, C, T, T, a)
+        denom = contract(TWO_CORNERS, a_corner, a_corner, ring)
+        b_corner = contract(CORNER, C, T, T, b)
+        num = contract(TWO_CORNERS, b_corner, b_corner, ring)
+
+        return value(-(num / denom) * 2)
 
     @staticmethod
-    def xi(data: dict) -> float:
+    def xi(data: dict) -> Union[float, np.ndarray]:
         """
         Return a tuple of the correlation length of the system
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        M = ncon([T, T], ([-1, -3, 3], [-2, -4, 3]))
-        # Reshape to matrix
-        M = M.reshape(T.shape[0] ** 2, T.shape[0] ** 2)
-        w = scipy.linalg.eigh(M, eigvals_only=True)
-        return float(1 / np.log(abs(w[-1]) / abs(w[-2])))
+        M = contract("...wyc,...xzc->...wxyz", T, T)
+        # Reshape to (a batch of) matrices
+        chi = T.shape[-2]
+        M = M.reshape(*M.shape[:-4], chi**2, chi**2)
+        w = largest_eigvals(M)
+        return value(1 / np.log(abs(w[..., -1]) / abs(w[..., -2])))
 
-    def delta(data: dict) -> float:
+    @staticmethod
+    def delta(data: dict) -> Union[float, np.ndarray]:
         """
         Return the refinement parameter delta of the transfer matrix
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        M = ncon([T, T], ([-1, -3, 3], [-2, -4, 3]))
-        # Reshape to matrix
-        M = M.reshape(T.shape[0] ** 2, T.shape[0] ** 2)
-        w = scipy.linalg.eigh(M, eigvals_only=True)
-        return -np.log(abs[w[-4]]) - -np.log(abs[w[-3]])
+        M = contract("...wyc,...xzc->...wxyz", T, T)
+        # Reshape to (a batch of) matrices
+        chi = T.shape[-2]
+        M = M.reshape(*M.shape[:-4], chi**2, chi**2)
+        w = largest_eigvals(M, k=4)
+        return value(-np.log(abs(w[..., 0])) - -np.log(abs(w[..., 1])))
 
     @staticmethod
-    def Z_fixed(data: dict) -> float:
+    def Z_fixed(data: dict) -> Union[float, np.ndarray]:
         """
         Return the value for the partition function of a fixed system.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        return float(
-            ncon(
-                [C, T_fixed, T, C, b, C, T, T, C],
-                (
-                    [1, 2],
-                    [1, 4, 3],
-                    [2, 8, 7],
-                    [4, 5],
-                    [3, 6, 7, 9],
-                    [8, 12],
-                    [5, 10, 6],
-                    [11, 12, 9],
-                    [10, 11],
-                ),
-            )
-        )
+        # Without fixed edges the environment would silently use the normal edge.
+        if T_fixed is None or np.asarray(T_fixed).dtype == object:
+            raise ValueError("No fixed edge tensors, the data requires `fixed=True`.")
+        env = environment(C, T, T_first=T_fixed)
+        return value(contract("...cfgi,...cfgi->...", env, b))
 
     @staticmethod
-    def m_fixed(data: dict):
+    def m_fixed(data: dict) -> Union[float, np.ndarray]:
         """
         Return the magnetization for a system with a fixed edge spin.
         """
         C, T, T_fixed, beta, a, a_fixed, b, b_fixed = unpack(data)
-        return np.sqrt(abs(float(Prop.Z_fixed(data) / Prop.Z(data))))
+        return value(np.sqrt(np.abs(Prop.Z_fixed(data) / Prop.Z(data))))
@@ -1,8 +1,39 @@
 import numpy as np
-from scipy.linalg import sqrtm
-from ncon import ncon
+import opt_einsum as oe
+import functools
 from dataclasses import dataclass, field
 
+# Contraction expressions of the Q matrices with the diagonal of the delta tensors,
+# for both the Ising (d = 2) and Blume-Capel (d = 3) model.
+EXPRESSIONS = {
+    d: {
+        "site": oe.contract_expression(
+            "ai,bi,ci,di,i->abcd", (d, d), (d, d), (d, d), (d, d), (d,)
+        ),
+        "corner": oe.contract_expression("ia,i,ib->ab", (d, d), (d,), (d, d)),
+        "edge": oe.contract_expression("ai,bi,ci,i->abc", (d, d), (d, d), (d, d), (d,)),
+    }
+    for d in (2, 3)
+}
+
+
+def cache_tensor(method):
+    """
+    Cache the tensor returned by a `Tensors` method for every value of `adj`. The
+    cached tensor is read-only, as it is shared by all callers.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "Tensors", adj=False) -> np.ndarray:
+        key = (method.__name__, adj)
+        if key not in self.cache:
+            tensor = method(self, adj)
+            tensor.flags.writeable = False
+            self.cache[key] = tensor
+        return self.cache[key]
+
+    return wrapper
+
 
 @dataclass
 class Tensors:
@@ -23,40 +54,40 @@ class Tensors:
     h: float = 0
     d: int = field(init=False)
     Q: np.ndarray = field(init=False)
+    cache: dict[tuple[str, bool], np.ndarray] = field(
+        init=False, repr=False, default_factory=dict
+    )
 
     def __post_init__(self):
         """
-        Compute the Q matrix for the given model.
+        Compute the Q matrix, the symmetric square root of the Boltzmann weights
+        of a bond, for the given model. Q is written out in the eigenbasis of the
+        weights, which is known in closed form.
         """
+        cosh, sinh = np.cosh(self.beta), np.sinh(self.beta)
 
         if self.model == "ising":
+            # Weights [[e^b, e^-b], [e^-b, e^b]] with eigenvalues 2cosh(b) and
+            # 2sinh(b) for the eigenvectors [1, 1] and [1, -1].
             self.d = 2
-            self.Q = sqrtm(
-                np.array(
-                    [
-                        [np.exp(self.beta), np.exp(-self.beta)],
-                        [np.exp(-self.beta), np.exp(self.beta)],
-                    ]
-                )
-            )
+            p, q = np.sqrt(2 * cosh), np.sqrt(max(2 * sinh, 0))
+            self.Q = np.array([[p + q, p - q], [p - q, p + q]]) / 2
         else:
+            # Weights [[e^b, 1, e^-b], [1, 1, 1], [e^-b, 1, e^b]]. The antisymmetric
+            # eigenvector [1, 0, -1] has eigenvalue 2sinh(b), the symmetric part
+            # is the 2x2 matrix B = [[2cosh(b), sqrt(2)], [sqrt(2), 1]] on the
+            # basis [1, 0, 1] / sqrt(2), [0, 1, 0], with sqrt(B) = (B + sI) / t.
             self.d = 3
-            self.Q = sqrtm(
-                np.array(
-                    [
-                        [
-                            np.exp(self.beta),
-                            1,
-                            np.exp(-self.beta),
-                        ],
-                        [1, 1, 1],
-                        [
-                            np.exp(-self.beta),
-                            1,
-                            np.exp(self.beta),
-                        ],
-                    ]
-                )
+            q = np.sqrt(max(2 * sinh, 0))
+            s = np.sqrt(max(2 * cosh - 2, 0))
+            t = np.sqrt(2 * cosh + 1 + 2 * s)
+            outer = (2 * cosh + s) / t
+            self.Q = np.array(
+                [
+                    [(outer + q) / 2, 1 / t, (outer - q) / 2],
+                    [1 / t, (1 + s) / t, 1 / t],
+                    [(outer - q) / 2, 1 / t, (outer + q) / 2],
+                ]
             )
 
     @staticmethod
@@ -72,13 +103,13 @@ class Tensors:
         if shape.count(shape[0]) != len(shape):
             raise Exception("The length of all dimensions has to be equal.")
 
+        # The flat index of the (i, i, ...) element is i * (1 + n + n^2 + ...).
         A = np.zeros(shape)
-        for index in np.ndindex(shape):
-            # If all indices are the same change value to 1, or if adj=True only
-            # if all indices are 0.   delta: np.ndarray = field(init=False)
-            k = 0 if adj else index[0]
-            if index.count(k) == len(index):
-                A[index] = 1
+        stride = sum(shape[0] ** k for k in range(len(shape)))
+        if adj:
+            A.flat[0] = 1
+        else:
+            A.flat[::stride] = 1
         return A
 
     def coupling_delta(self, dimension: int, adj=False) -> np.ndarray:
@@ -91,22 +122,21 @@ class Tensors:
         is fixed with only a spin -1.
         """
         shape = tuple((self.d for _ in range(dimension)))
+        stride = sum(self.d**k for k in range(dimension))
         A = np.zeros(shape)
-
+        # Scatter the Boltzmann factors of the spins on the diagonal, also for the
+        # Ising model, of which `weights` are ones. Only the -1 spin is set if
+        # adjusted.
+        w = np.array(
+            [
+                np.exp(-self.beta * (self.coupling + self.h)),
+                1,
+                np.exp(-self.beta * (self.coupling - self.h)),
+            ]
+        )[: self.d]
         if adj:
-            for index in np.ndindex(shape):
-                # Set only the -1 spin.
-                if index.count(0) == len(index):
-                    A[index] = np.exp(-self.beta * (self.coupling + self.h))
-                    return A
-
-        for index in np.ndindex(shape):
-            if index.count(0) == len(index):
-                A[index] = np.exp(-self.beta * (self.coupling + self.h))
-            if index.count(1) == len(index):
-                A[index] = 1
-            if index.count(2) == len(index):
-                A[index] = np.exp(-self.beta * (self.coupling - self.h))
+            w[1:] = 0
+        A.flat[::stride] = w
         return A
 
     @staticmethod
@@ -119,6 +149,30 @@ class Tensors:
         c = np.random.uniform(size=shape)
         return Methods.symmetrize(c)
 
+    def weights(self, adj=False) -> np.ndarray:
+        """
+        Returns the diagonal of the (coupling) delta tensor, which is the same
+        for every rank. Contracting the Q matrices with this vector is equal to
+        contracting them with the full delta tensor.
+
+        `adj` (bool): If true, the diagonal of the adjusted delta tensor is
+        returned, which only keeps the first spin.
+        """
+        if self.model == "ising":
+            w = np.ones(self.d)
+        else:
+            w = np.array(
+                [
+                    np.exp(-self.beta * (self.coupling + self.h)),
+                    1,
+                    np.exp(-self.beta * (self.coupling - self.h)),
+                ]
+            )
+        if adj:
+            w[1:] = 0
+        return w
+
+    @cache_tensor
     def a(self, adj=False) -> np.ndarray:
         """
         Returns the tensor representation of a single lattice site in the
@@ -127,18 +181,10 @@ class Tensors:
         `adj` (bool): If true the adjusted delta will be used for the lattice
         site, which fixes the corner spin to one direction.
         """
-        delta = (
-            self.delta((self.d, self.d, self.d, self.d), adj)
-            if self.model == "ising"
-            else self.coupling_delta(4, adj)
-        )
-        return np.array(
-            ncon(
-                [self.Q, self.Q, self.Q, self.Q, delta],
-                ([-1, 1], [-2, 2], [-3, 3], [-4, 4], [1, 2, 3, 4]),
-            )
-        )
+        Q = self.Q
+        return np.asarray(EXPRESSIONS[self.d]["site"](Q, Q, Q, Q, self.weights(adj)))
 
+    @cache_tensor
     def b(self, adj=False) -> np.ndarray:
         """
         Returns the tensor representation for a single lattice site in the
@@ -147,21 +193,18 @@ class Tensors:
         `adj` (bool): If true the adjusted delta will be used for the lattice
         site, which fixes the corner spin to one direction.
         """
+        # Weigh every spin by its value.
+        w = self.weights(adj)
         if self.model == "ising":
-            delta = self.delta((self.d, self.d, self.d, self.d), adj)
-            delta[1, :, :, :] *= -1.0
+            w[1] *= -1.0
         else:
-            delta = self.coupling_delta(4, adj)
-            delta[0, :, :, :] *= -1.0
-            delta[1, :, :, :] *= 0
-
-        return np.array(
-            ncon(
-                [self.Q, self.Q, self.Q, self.Q, delta],
-                ([-1, 1], [-2, 2], [-3, 3], [-4, 4], [1, 2, 3, 4]),
-            )
-        )
+            w[0] *= -1.0
+            w[1] *= 0
+
+        Q = self.Q
+        return np.asarray(EXPRESSIONS[self.d]["site"](Q, Q, Q, Q, w))
 
+    @cache_tensor
     def C_init(self, adj=False) -> np.ndarray:
         """
         Returns the initial corner tensor for a system with boundary conditions.
@@ -169,18 +212,11 @@ class Tensors:
         `adj` (bool): If true the adjusted delta will be used for the lattice
         site, which fixes the corner spin to one direction.
         """
-        delta = (
-            self.delta((self.d, self.d), adj)
-            if self.model == "ising"
-            else self.coupling_delta(2, adj)
-        )
-        return np.array(
-            ncon(
-                [self.Q, delta, self.Q],
-                ([1, -1], [1, 2], [-2, 2]),
-            )
+        return np.asarray(
+            EXPRESSIONS[self.d]["corner"](self.Q, self.weights(adj), self.Q)
         )
 
+    @cache_tensor
     def T_init(self, adj=False) -> np.ndarray:
         """
         Returns the initial edge tensor for a system with boundary conditions.
@@ -188,17 +224,17 @@ class Tensors:
         `adj` (bool): If true the adjusted delta will be used for the lattice
         site, which fixes the edge spin to one direction.
         """
-        delta = (
-            self.delta((self.d, self.d, self.d), adj)
-            if self.model == "ising"
-            else self.coupling_delta(3, adj)
-        )
-        return np.array(
-            ncon(
-                [self.Q, self.Q, self.Q, delta],
-                ([-1, 1], [-2, 2], [-3, 3], [1, 2, 3]),
-            )
-        )
+        Q = self.Q
+        return np.asarray(EXPRESSIONS[self.d]["edge"](Q, Q, Q, self.weights(adj)))
+
+
+@functools.lru_cache(maxsize=1024)
+def cached_tensors(beta: float, model="ising", coupling=1, h=0) -> Tensors:
+    """
+    Return the (shared) `Tensors` for the given parameters. Sweeps that revisit
+    the same temperatures, e.g. for every chi, then build the tensors only once.
+    """
+    return Tensors(beta, model, coupling, h)
 
 
 @dataclass
@@ -206,20 +242,32 @@ class Methods:
     """This class contains methods for np.arrays, required for the CTM algorithm."""
 
     @staticmethod
-    def symmetrize(M: np.ndarray) -> np.ndarray:
+    def symmetrize(M: np.ndarray, out=None) -> np.ndarray:
         """
         Symmetrize the array about the first two axes. Only works for 2 or 3
         dimensional arrays.
+
+        `out` (np.ndarray | None): Optional array of the same shape to store the
+        result in, e.g. `M` itself.
         """
         if len(M.shape) != 2 and len(M.shape) != 3:
             raise Exception("M has to a 2 or 3 dimensional array.")
 
         axes = (1, 0) if len(M.shape) == 2 else (1, 0, 2)
-        return np.array(M + np.transpose(M, axes)) / 2
+        out = np.add(M, np.transpose(M, axes), out=out)
+        # Halve in place, to only allocate the sum. An integer sum can not hold
+        # the halves, so return a new float array for it.
+        if not np.issubdtype(out.dtype, np.inexact):
+            return np.asarray(out / 2)
+        return np.asarray(np.multiply(out, 0.5, out=out))
 
     @staticmethod
-    def normalize(M: np.ndarray) -> np.ndarray:
+    def normalize(M: np.ndarray, out=None) -> np.ndarray:
         """
-        Divide all elements in the given array by its largest value.
+        Divide all elements in the given array by its largest absolute value.
+
+        `out` (np.ndarray | None): Optional array of the same shape to store the
+        result in, e.g. `M` itself.
         """
-        return np.array(M / np.amax(M))
+        # The largest absolute value from the extremes, without allocating |M|.
+        return np.asarray(np.divide(M, np.maximum(np.max(M), -np.min(M)), out=out))
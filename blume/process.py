@@ -1,15 +1,25 @@
 import json
-import matplotlib.pyplot as plt
+import base64
+import orjson
 import numpy as np
+import opt_einsum as oe
 import typing
 import pathlib
 import os
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 from .model.post_props import Prop, PropFunction
+from .model.tensors import cached_tensors
+
+if typing.TYPE_CHECKING:
+    import matplotlib.pyplot as plt
 
 
 @typing.no_type_check
-def plot_file(fn: str, range: tuple, prop: Prop | str, folder: str) -> plt.Line2D:
+def plot_file(fn: str, range: tuple, prop: Prop | str, folder: str) -> "plt.Line2D":
     """
     Plot a given variable against temperature.
 
@@ -22,35 +32,256 @@ def plot_file(fn: str, range: tuple, prop: Prop | str, folder: str) -> plt.Line2
 
     Returns the created line2D object.
     """
-    data = read(folder, fn)
+    # Imported here, such that reading and computing data does not import it.
+    import matplotlib.pyplot as plt
+
+    data = read_arrays(folder, fn)
 
     # If string is given, the propery already exists in the data, else compute
     # the property with the function.
-    y = data[prop] if type(prop) == str else compute(prop, data)
+    y = data[prop] if type(prop) == str else compute_file(prop, folder, fn)
 
     temps = data["temperatures"]
     # Find the indices closest to the range values.
-    lower_value = min(temps, key=lambda x: abs(x - range[1]))
-    upper_value = min(temps, key=lambda x: abs(x - range[0]))
-    lower_index = temps.index(lower_value)
-    upper_index = temps.index(upper_value)
+    upper_index, lower_index = closest_indices(temps, range)
 
     (line,) = plt.plot(temps[upper_index:lower_index], y[upper_index:lower_index])
     return line
 
 
+@typing.no_type_check
+def plot_files(
+    fns: list[str], range: tuple, props: list[Prop | str], folder: str
+) -> "dict[Prop | str, list[plt.Line2D]]":
+    """
+    Plot several variables against temperature for several files, each variable
+    in its own figure. Every file is read once and all its properties are computed
+    together, sharing their common contractions.
+
+    `fns` (list): File names of the json files, e.g. one per chi.
+    `range` (tuple): Range of temperatures to plot.
+    `props` (list): Functions for calculating the variables or strings of the
+    names of properties that already exist in the data.
+    `folder` (str): Folder that contains the data.
+
+    Returns a dict with, for every property, the created line2D objects in the
+    order of `fns`.
+    """
+    import matplotlib.pyplot as plt
+
+    figures = {prop: plt.figure() for prop in props}
+    lines = {prop: [] for prop in props}
+    funcs = [prop for prop in props if type(prop) != str]
+
+    for fn in fns:
+        data = read_arrays(folder, fn)
+        computed = dict(zip(funcs, compute_many(funcs, data)))
+
+        temps = data["temperatures"]
+        upper_index, lower_index = closest_indices(temps, range)
+        for prop in props:
+            y = data[prop] if type(prop) == str else computed[prop]
+            plt.figure(figures[prop])
+            (line,) = plt.plot(
+                temps[upper_index:lower_index], y[upper_index:lower_index]
+            )
+            lines[prop].append(line)
+    return lines
+
+
+def closest_indices(values: list, targets) -> np.ndarray:
+    """
+    Return, for every target, the index of the value closest to it. Ties go to the
+    first of the values.
+
+    `values` (list): Values to search in, e.g. the temperatures of a sweep.
+    `targets` (array_like): Values to look up.
+    """
+    arr = np.asarray(values)
+    # Sweeps are sorted already, so only sort if needed.
+    ascending = bool(np.all(arr[:-1] <= arr[1:]))
+    order = np.arange(len(arr)) if ascending else np.argsort(arr, kind="stable")
+    sorted_values = arr[order]
+
+    # The closest value is either the first value larger or equal to the target,
+    # or the (first occurrence of the) value before.
+    right = np.clip(np.searchsorted(sorted_values, targets), 1, len(arr) - 1)
+    left = np.searchsorted(sorted_values, sorted_values[right - 1])
+    dist_left = np.abs(sorted_values[left] - targets)
+    dist_right = np.abs(sorted_values[right] - targets)
+    use_left = (dist_left < dist_right) | (
+        (dist_left == dist_right) & (order[left] < order[right])
+    )
+    return np.asarray(order[np.where(use_left, left, right)])
+
+
 def read(folder: str, fn: str) -> dict:
     """
-    Read the data in a specific folder for a specific parameter value.
+    Read the data in a specific folder for a specific parameter value. Tensors
+    saved in the binary `.npz` file next to the json file are returned as lists,
+    like the tensors saved in the json file itself.
 
     folder (str): name of the folder that contains the data.
     fn (str): file name of the json file.
     val (int): value of the parameter corresponding to the desired file to read.
     """
+    data = _read_json(folder, fn) | _read_npz(folder, fn)
+    return {key: to_list(val) for key, val in data.items()}
+
+
+def read_arrays(folder: str, fn: str) -> dict:
+    """
+    Read the data in a specific folder for a specific parameter value, with the
+    tensors as (read-only) numpy arrays. The result is cached, such that computing
+    or plotting several properties of the same file only reads and converts it
+    once. A file that is modified afterwards is read again.
+
+    folder (str): name of the folder that contains the data.
+    fn (str): file name of the json file.
+    """
+    return _read_arrays(folder, fn, mtimes(folder, fn))
+
+
+@functools.lru_cache(maxsize=32)
+def _read_arrays(folder: str, fn: str, mtimes: tuple) -> dict:
+    # Binary tensors are used as is, only tensors from the json file are converted.
+    data = to_arrays(_read_json(folder, fn) | _read_npz(folder, fn))
+    for key in TENSOR_KEYS:
+        if key in data:
+            data[key].flags.writeable = False
+    return data
+
+
+def _read_json(folder: str, fn: str) -> dict:
+    with open(data_path(folder, fn), "rb") as f:
+        content = f.read()
+    try:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        # orjson is strict, e.g. it does not accept the NaN that json writes.
+        data = json.loads(content)
+    return {key: decode(val) for key, val in data.items()}
+
+
+def decode(val):
+    """
+    Reconstruct the numpy arrays in `val` that are encoded as base64 raw bytes.
+    """
+    if isinstance(val, dict) and "__ndarray__" in val:
+        buffer = base64.b64decode(val["__ndarray__"])
+        return np.frombuffer(buffer, dtype=val["dtype"]).reshape(val["shape"])
+    if isinstance(val, list):
+        return [decode(v) for v in val]
+    return val
+
+
+def to_list(val):
+    """
+    Convert the numpy arrays in `val` to (nested) lists.
+    """
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+    if isinstance(val, list):
+        return [to_list(v) for v in val]
+    return val
+
+
+def _read_npz(folder: str, fn: str) -> dict:
+    path = data_path(folder, fn, suffix=".npz")
+    if not os.path.isfile(path):
+        return {}
+    with np.load(path) as arrays:
+        return {key: arrays[key] for key in arrays.files}
+
+
+def compute_file(prop: PropFunction, folder: str, fn: str) -> list:
+    """
+    Compute the corresponding property for a data file. The result is cached, such
+    that plotting the same property of a file again, e.g. for a different range,
+    does not recompute it. A file that is modified afterwards is computed again.
+
+    `prop` (Prop): Desired thermodynamic property to compute from data.
+    `folder` (str): Name of the folder that contains the data.
+    `fn` (str): File name of the json file.
+
+    Returns a list with the computed property for all temperatures in the file.
+    """
+    return list(_compute_file_cached(prop, folder, fn, mtimes(folder, fn)))
+
+
+@functools.lru_cache(maxsize=128)
+def _compute_file_cached(prop: PropFunction, folder: str, fn: str, mtimes: tuple):
+    return tuple(compute(prop, read_arrays(folder, fn)))
+
+
+def mtimes(folder: str, fn: str) -> tuple:
+    """
+    Return the modification times of the json file `fn` and of the `.npz` file
+    next to it (None if there is none), which together identify the data read
+    from them.
+    """
+    npz_path = data_path(folder, fn, suffix=".npz")
+    npz_mtime = os.path.getmtime(npz_path) if os.path.isfile(npz_path) else None
+    return os.path.getmtime(data_path(folder, fn)), npz_mtime
+
+
+def data_path(folder: str, fn: str, suffix=".json") -> str:
+    """
+    Return the path of the json file `fn` in the data folder `folder`, or of the
+    file with the same name and the given `suffix`.
+    """
     root_dir = pathlib.Path(__file__).parent.parent
-    path = os.path.join(root_dir, f"data/{folder}/{fn}.json")
-    with open(path, "r") as f:
-        return dict(json.loads(f.read()))
+    return os.path.join(root_dir, f"data/{folder}/{fn}{suffix}")
+
+
+TENSOR_KEYS = (
+    "converged corners",
+    "converged edges",
+    "converged fixed edges",
+    "a tensors",
+    "a_fixed tensors",
+    "b tensors",
+    "b_fixed tensors",
+)
+
+
+def to_arrays(data: dict) -> dict:
+    """
+    Return a copy of the data with the (nested) lists of tensors converted to
+    numpy arrays. Tensors that already are arrays are not copied.
+
+    Converting the lists read from a json file takes a large part of the time
+    of computing a property, so when several properties are computed from the
+    same data, convert the data once and pass the result to `compute`.
+
+    `data` (dict): Dictionary containing the algorithm data.
+    """
+    return {
+        key: np.asarray(val) if key in TENSOR_KEYS else val for key, val in data.items()
+    }
+
+
+def build_ab(temps: list, model: str, couplings: list, hs: list) -> dict:
+    """
+    Build the a and b tensors for every temperature of a sweep, as stacked arrays
+    with the keys of the algorithm data. The tensors are cheap to build from the
+    model parameters, which is why they are not saved with the data.
+
+    `temps` (list): Temperature of every point of the sweep.
+    `model` (str): "ising" or "blume".
+    `couplings` (list): Crystal-field coupling of every point of the sweep.
+    `hs` (list): External magnetic field of every point of the sweep.
+    """
+    tensors = [
+        cached_tensors(1 / temp, model, coupling, h)
+        for temp, coupling, h in zip(temps, couplings, hs)
+    ]
+    return {
+        "a tensors": np.array([t.a() for t in tensors]),
+        "a_fixed tensors": np.array([t.a(adj=True) for t in tensors]),
+        "b tensors": np.array([t.b() for t in tensors]),
+        "b_fixed tensors": np.array([t.b(adj=True) for t in tensors]),
+    }
 
 
 def compute(
@@ -59,55 +290,117 @@ def compute(
 ) -> list:
     """
     Compute the corresponding property for a given dictionary of data from the
-    algorithm.
+    algorithm. The property is evaluated for all temperatures in a single batched
+    call.
 
     `prop` (Prop): Desired thermodynamic property to compute from data.
     `data` (dict): Dictionary containing the algorithm data.
 
     Returns a list with the computed property for all temperatures in data.
     """
-    if "temperatures" in data:
-        temps = data["temperatures"]
-    else:
-        temps = [data["temperature"] for _ in range(len(data["a tensors"]))]
-
-    data_zip = zip(
-        temps,
-        np.asarray(data["converged corners"]),
-        np.asarray(data["converged edges"]),
-        np.asarray(data["converged fixed edges"]),
-        np.asarray(data["a tensors"]),
-        np.asarray(data["a_fixed tensors"]),
-        np.asarray(data["b tensors"]),
-        np.asarray(data["b_fixed tensors"]),
+    return compute_many([prop], data)[0]
+
+
+def compute_many(props: list[PropFunction], data: dict) -> list[list]:
+    """
+    Compute several properties for the same dictionary of data from the
+    algorithm. Intermediate contractions that the properties have in common,
+    e.g. the environment shared by `Prop.Z` and `Prop.m`, are only computed once.
+
+    `props` (list): Desired thermodynamic properties to compute from data.
+    `data` (dict): Dictionary containing the algorithm data.
+
+    Returns a list with, for every property, a list of the computed property for
+    all temperatures in data.
+    """
+    n = len(data["converged corners"])
+    temps = (
+        data["temperatures"] if "temperatures" in data else [data["temperature"]] * n
     )
-    return [
-        prop(
-            {
-                "beta": 1 / item[0],
-                "C": item[1],
-                "T": item[2],
-                "T_fixed": item[3],
-                "a": item[4],
-                "a_fixed": item[5],
-                "b": item[6],
-                "b_fixed": item[7],
-            }
-        )
-        for item in data_zip
-    ]
 
+    # Data saved before the a and b tensors were left out still contains them.
+    if "a tensors" not in data:
+        couplings = data.get("couplings", [data.get("coupling", 1)] * n)
+        hs = data.get("hs", [data.get("h", 0)] * n)
+        data = data | build_ab(temps, data.get("model", "ising"), couplings, hs)
+
+    # Evaluate all temperatures at once, with the temperature as batch axis.
+    data = to_arrays(data)
+    batch = {
+        "beta": 1 / np.asarray(temps),
+        "C": data["converged corners"],
+        "T": data["converged edges"],
+        "T_fixed": data["converged fixed edges"],
+        "a": data["a tensors"],
+        "a_fixed": data["a_fixed tensors"],
+        "b": data["b tensors"],
+        "b_fixed": data["b_fixed tensors"],
+    }
+    with oe.shared_intermediates():
+        return [np.asarray(prop(batch)).tolist() for prop in props]
+
+
+def compute_files(
+    prop: PropFunction, folder: str, fns: list[str], workers: int | None = None
+) -> list[list]:
+    """
+    Compute the corresponding property for several data files in the same
+    folder, e.g. one file per chi. The files are independent, so each one is read
+    and computed in a separate process.
+
+    `prop` (Prop): Desired thermodynamic property to compute from data.
+    `folder` (str): Name of the folder that contains the data.
+    `fns` (list): File names of the json files.
+    `workers` (int | None): Number of processes, defaults to the number of CPUs.
 
-def exact_m(range: tuple[float, float], step=0.0001) -> tuple[list, list]:
+    Returns a list with the computed property list for every file in `fns`.
+    """
+    return [ys[0] for ys in compute_files_many([prop], folder, fns, workers)]
+
+
+def compute_files_many(
+    props: list[PropFunction],
+    folder: str,
+    fns: list[str],
+    workers: int | None = None,
+) -> list[list[list]]:
+    """
+    Compute several properties for several data files in the same folder. Every
+    file is read once and all properties of it are computed in the same process,
+    such that e.g. the magnetization, free energy and energy per site of all chi
+    are obtained in one parallel pass before plotting.
+
+    `props` (list): Desired thermodynamic properties to compute from data.
+    `folder` (str): Name of the folder that contains the data.
+    `fns` (list): File names of the json files.
+    `workers` (int | None): Number of processes, defaults to the number of CPUs.
+
+    Returns, for every file in `fns`, the list that `compute_many` returns.
+    """
+    # Use 'spawn' to not copy the (matplotlib) state of the parent process.
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return list(executor.map(_compute_file, repeat(props), repeat(folder), fns))
+
+
+def _compute_file(props: list[PropFunction], folder: str, fn: str) -> list[list]:
+    return compute_many(props, read_arrays(folder, fn))
+
+
+def exact_m(range: tuple[float, float], step=0.0001) -> tuple[np.ndarray, np.ndarray]:
     """
     Give the exact solution for the magnetization on a given temperature range.
 
     range (tuple): The desired temperature range to plot.
     step (float): stepsize.
+
+    Returns a tuple of arrays of the temperatures and magnetizations.
     """
     T_c = 2 / np.log(1 + np.sqrt(2))
-    x, y = [], []
-    for T in np.arange(range[0], range[1], step):
-        x.append(T)
-        y.append(0 if T > T_c else (1 - np.sinh(2 * 1 / T) ** (-4)) ** (1 / 8))
-    return x, y
+    T = np.arange(range[0], range[1], step)
+    m = np.zeros_like(T)
+    # The magnetization is zero above T_c, only evaluate the formula below it.
+    below = T <= T_c
+    m[below] = (1 - np.sinh(2 / T[below]) ** (-4)) ** (1 / 8)
+    return T, m
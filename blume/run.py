@@ -1,15 +1,19 @@
 from .model.CTM_alg import CtmAlg
 
 import numpy as np
-import json
+import orjson
+import base64
 from tqdm import tqdm
 import os
 import pathlib
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, replace, asdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import multiprocessing
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ModelParameters:
     """
     `model` (str): "ising" or "blume".
@@ -29,6 +33,10 @@ class ModelParameters:
     `b_c` (bool): Set a fixed boundary conditions on the system if True.
     `fixed`(bool): Compute an additional edge tensor with an initial fixed spin.
     `bar` (bool): If true, a progress bar and save messages are displayed.
+    `workers` (int | None): Number of processes to sweep with, None for all CPUs.
+    If `use_prev` is false the temperatures are swept in parallel, else the sweep
+    is serial and the values of the varying parameter of `Results` are run in
+    parallel instead.
     """
 
     model: str = "ising"
@@ -45,6 +53,7 @@ class ModelParameters:
     b_c: bool = False
     fixed: bool = False
     bar: bool = True
+    workers: int | None = 1
 
 
 class Results:
@@ -75,14 +84,34 @@ class Results:
         if params is None:
             params = self.default_params
 
-        if self.varying_param:
-            for val in self.range:
-                setattr(params, self.varying_param, val)
-                data = self.sweep_var(params, sweeping_param)
-                self.save(data, params.bar)
+        if not self.varying_param:
+            self.sweep_save(params, sweeping_param)
+            return
+
+        all_params = [replace(params, **{self.varying_param: v}) for v in self.range]
+        if params.use_prev and params.workers != 1:
+            # The sweeps themselves are serial, but the sweeps for the different
+            # values of the varying parameter are independent, so execute those
+            # in parallel. Use 'spawn' to not copy the state of the parent process.
+            with ProcessPoolExecutor(
+                max_workers=params.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                list(executor.map(self.sweep_save, all_params, repeat(sweeping_param)))
         else:
-            data = self.sweep_var(params, sweeping_param)
-            self.save(data, params.bar)
+            for params in all_params:
+                self.sweep_save(params, sweeping_param)
+
+    def sweep_save(self, params: ModelParameters, sweeping_param: str):
+        """
+        Sweep the given parameter and save the data.
+
+        `params` (ModelParameters): class instance of the dataclass containing the
+        model parameters.
+        `sweeping_param` (str): parameter to sweep.
+        """
+        data = self.sweep_var(params, sweeping_param)
+        self.save(data, params.bar)
 
     def sweep_var(self, params: ModelParameters, sweeping_param: str):
         """
@@ -97,11 +126,10 @@ class Results:
         Returns a dict containing the ModelParameters and algorithm data.
         """
         data = []
-        C_init, T_init = (None, None)
 
         # Allow a list or range tuple for `T_range`.
-        params_to_sweep = (
-            params.var_range
+        params_to_sweep: np.ndarray = (
+            np.asarray(params.var_range)
             if isinstance(params.var_range, list)
             else np.arange(params.var_range[0], params.var_range[1], params.step)
         )
@@ -113,42 +141,30 @@ class Results:
             else None
         )
 
-        for param in tqdm(params_to_sweep, desc=desc, disable=not (params.bar)):  # type: ignore
-            setattr(params, sweeping_param, param)
-            alg = CtmAlg(
-                1 / params.temperature,
-                model=params.model,
-                coupling=params.coupling,
-                h=params.h,
-                chi=params.chi,
-                C_init=C_init,
-                T_init=T_init,
-                b_c=params.b_c,
-                fixed=params.fixed,
-            )
-            alg.exe(params.tol, params.count, params.max_steps)
-
-            if params.use_prev:
-                C_init, T_init = alg.C, alg.T
-
-            # Save execution time, temperature and the converged corner and edge and
-            # the a and b tensors.
-            data.append(
-                (
-                    alg.n_iter,
-                    param,
-                    alg.C,
-                    alg.T,
-                    alg.T_fixed,
-                    alg.a,
-                    alg.a_fixed,
-                    alg.b,
-                    alg.b_fixed,
+        if params.use_prev or params.workers == 1:
+            alg = None
+            for param in tqdm(params_to_sweep, desc=desc, disable=not (params.bar)):  # type: ignore
+                params = replace(params, **{sweeping_param: param})
+                alg = new_alg(params, alg if params.use_prev else None, sweeping_param)
+                alg.exe(params.tol, params.count, params.max_steps)
+                data.append(alg_data(alg, param))
+        else:
+            # The temperatures are independent, so execute them in parallel. Use
+            # 'spawn' to not copy the state of the parent process.
+            with ProcessPoolExecutor(
+                max_workers=params.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                points = executor.map(
+                    sweep_point, repeat(params), repeat(sweeping_param), params_to_sweep
                 )
-            )
+                n = len(params_to_sweep)
+                bar = tqdm(points, total=n, desc=desc, disable=not (params.bar))
+                data = list(bar)
+            params = replace(params, **{sweeping_param: params_to_sweep[-1]})
 
         # Return both the parameters and algorithm data in the same dict.
-        return params.__dict__ | data_to_dict(data, sweeping_param)
+        return asdict(params) | data_to_dict(data, sweeping_param)
 
     def save(self, data: dict, msg: bool):
         """
@@ -169,15 +185,78 @@ class Results:
             fn = "data"
 
         root_dir = pathlib.Path(__file__).parent.parent
-        path = os.path.join(root_dir, f"data/{self.dir}/{fn}.json")
-
-        with open(path, "w") as fp:
-            json.dump(data, fp, cls=NumpyEncoder)
+        path = os.path.join(root_dir, f"data/{self.dir}/{fn}")
+
+        # Save the tensors in a binary file and the remaining data in a json file.
+        arrays: dict[str, np.ndarray] = {
+            key: np.stack(val) for key, val in data.items() if stackable(val)
+        }
+        # Newer numpy stubs also match the keywords to `allow_pickle`.
+        np.savez_compressed(f"{path}.npz", **arrays)  # type: ignore[arg-type]
+        with open(f"{path}.json", "wb") as fp:
+            data = {key: val for key, val in data.items() if key not in arrays}
+            fp.write(orjson.dumps(data, default=encode))
 
         if msg:
             print("Done \n")
 
 
+def sweep_point(params: ModelParameters, sweeping_param: str, param) -> tuple:
+    """
+    Execute the CTM algorithm for a single value `param` of the sweeping parameter.
+
+    `params` (ModelParameters): class instance of the dataclass containing the
+    model parameters.
+    `sweeping_param` (str): parameter to sweep.
+    `param`: value of the sweeping parameter.
+
+    Returns the tuple of `alg_data`.
+    """
+    params = replace(params, **{sweeping_param: param})
+    alg = new_alg(params)
+    alg.exe(params.tol, params.count, params.max_steps)
+    return alg_data(alg, param)
+
+
+def new_alg(
+    params: ModelParameters, prev: CtmAlg | None = None, sweeping_param=None
+) -> CtmAlg:
+    """
+    Return the CTM algorithm for the given model parameters.
+
+    `params` (ModelParameters): class instance of the dataclass containing the
+    model parameters.
+    `prev` (CtmAlg | None): Optional algorithm of the previous sweep value, of
+    which the converged corner and edge are used as initial tensors.
+    `sweeping_param` (str | None): parameter that is swept.
+    """
+    if prev is not None and sweeping_param == "temperature" and not params.b_c:
+        # Only the temperature changed, so reuse the algorithm.
+        prev.set_beta(1 / params.temperature)
+        return prev
+
+    return CtmAlg(
+        1 / params.temperature,
+        model=params.model,
+        coupling=params.coupling,
+        h=params.h,
+        chi=params.chi,
+        C_init=None if prev is None else prev.C,
+        T_init=None if prev is None else prev.T,
+        b_c=params.b_c,
+        fixed=params.fixed,
+    )
+
+
+def alg_data(alg: CtmAlg, param) -> tuple:
+    """
+    Returns a tuple of the number of iterations, the parameter value and the
+    converged corner and edges of an executed algorithm. The a and b tensors
+    follow from the model parameters, so they are not stored.
+    """
+    return (alg.n_iter, param, alg.C, alg.T, alg.T_fixed)
+
+
 def data_to_dict(data: list, sweeping_param: str) -> dict:
     """
     Convert the list with tuple of the data to a dict.
@@ -189,43 +268,59 @@ def data_to_dict(data: list, sweeping_param: str) -> dict:
         "converged corners": data[2],
         "converged edges": data[3],
         "converged fixed edges": data[4],
-        "a tensors": data[5],
-        "a_fixed tensors": data[6],
-        "b tensors": data[7],
-        "b_fixed tensors": data[8],
     }
 
 
+def stackable(val) -> bool:
+    """
+    Return true if the value is a non-empty sequence of arrays of the same shape,
+    e.g. the converged corners of all temperatures.
+    """
+    return (
+        isinstance(val, (list, tuple))
+        and len(val) > 0
+        and all(isinstance(x, np.ndarray) for x in val)
+        and len({x.shape for x in val}) == 1
+    )
+
+
 def new_folder():
     """
-    Make a new folder in the data directory with the date as name, if it does
-    not exist yet.
+    Make a new folder in the data directory with the date and time, up to
+    microseconds, as name. If that folder exists already, a "(i)" suffix is added,
+    such that every run writes to its own folder.
 
     Returns the folder name as string.
     """
-    now = datetime.now().strftime("%d-%m %H:%M")
+    now = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
     root_dir = pathlib.Path(__file__).parent.parent
-    path = os.path.join(root_dir, f"data/{now}")
 
-    # Don't overwrite already existing directory
+    # Don't overwrite an already existing directory, also not when another run
+    # creates it in the meantime.
     fn = now
-    right_path = path
     i = 1
-    while os.path.isdir(f"{right_path}"):
-        right_path = f"{path}({i})"
-        fn = f"{now}({i})"
-        i += 1
-
-    os.mkdir(right_path)
-    return fn
+    while True:
+        try:
+            os.mkdir(os.path.join(root_dir, f"data/{fn}"))
+            return fn
+        except FileExistsError:
+            fn = f"{now}({i})"
+            i += 1
 
 
-class NumpyEncoder(json.JSONEncoder):
+def encode(obj):
     """
-    Class for encoding a np.ndarray to JSON
+    Encode the numpy objects that orjson does not serialize. Arrays are stored as
+    their base64 encoded raw bytes together with their dtype and shape, which is
+    smaller than nested lists and preserves the exact values, including NaN.
     """
-
-    def default(self, obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        return {
+            "__ndarray__": base64.b64encode(obj.tobytes()).decode(),
+            "dtype": str(obj.dtype),
+            "shape": obj.shape,
+        }
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError
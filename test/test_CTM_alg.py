@@ -3,7 +3,7 @@ from blume.model.tensors import Tensors
 
 import unittest
 import numpy as np
-from ncon import ncon
+import opt_einsum as oe
 
 
 class TestIsingCtmAlg(unittest.TestCase):
@@ -29,7 +29,7 @@ class TestIsingCtmAlg(unittest.TestCase):
         self.M = self.alg.new_M()
         self.U, _ = self.alg.new_U(self.M)
         self.untrunc_U, _ = self.alg.new_U(self.M, False)
-        self.C = self.alg.new_C(self.U)
+        self.C = self.alg.new_C(self.U, self.M)
         self.T = self.alg.new_T(self.U)
 
     def test_shapes(self):
@@ -74,7 +74,7 @@ class TestIsingCtmAlg(unittest.TestCase):
         with self.subTest():
             self.assertTrue(
                 np.allclose(
-                    self.T, np.transpose(self.T, axes=(0, 1, 2)), rtol=1e-8, atol=1e-8
+                    self.T, np.transpose(self.T, axes=(1, 0, 2)), rtol=1e-8, atol=1e-8
                 ),
                 f"The edge tensor is not symmetric, \nT = \n{self.T}, \nT.T = \n{self.T.T}",
             )
@@ -83,10 +83,8 @@ class TestIsingCtmAlg(unittest.TestCase):
         """
         Test that the untruncated renormalization tensor U is unitary.
         """
-        untrunc_product = ncon(
-            [self.untrunc_U, self.untrunc_U], ([-1, 1, 2], [-2, 1, 2])
-        )
-        product = ncon([self.U, self.U], ([-1, 1, 2], [-2, 1, 2]))
+        untrunc_product = oe.contract("aij,bij->ab", self.untrunc_U, self.untrunc_U)
+        product = oe.contract("aij,bij->ab", self.U, self.U)
 
         with self.subTest():
             self.assertTrue(
@@ -110,16 +108,14 @@ class TestIsingCtmAlg(unittest.TestCase):
         """
 
         # "Manual" calculation of two contracted corners.
-        corner = ncon(
-            [
-                self.tensors.C_init(),
-                self.tensors.T_init(),
-                self.tensors.T_init(),
-                self.tensors.a(),
-            ],
-            ([1, 2], [-3, 2, 3], [-1, 1, 4], [-2, -4, 3, 4]),
+        corner = oe.contract(
+            "ef,cfg,aeh,bdgh->abcd",
+            self.tensors.C_init(),
+            self.tensors.T_init(),
+            self.tensors.T_init(),
+            self.tensors.a(),
         )
-        two_corners = ncon([corner, corner], ([-1, -2, 1, 2], [-3, -4, 1, 2]))
+        two_corners = oe.contract("abef,cdef->abcd", corner, corner)
 
         alg = CtmAlg(beta=0.5, b_c=True, model=self.model)
         M = alg.new_M()
@@ -127,13 +123,47 @@ class TestIsingCtmAlg(unittest.TestCase):
 
         # Algorithm calculation of two contracted corners with two
         # untruncated renormalization tensors U in between.
-        two_corners_alg = ncon(
-            [M, untrunc_U, untrunc_U, M],
-            ([-1, -2, 1, 2], [3, 1, 2], [3, 5, 4], [-3, -4, 5, 4]),
+        two_corners_alg = oe.contract(
+            "abef,gef,gih,cdih->abcd", M, untrunc_U, untrunc_U, M
         )
         # The two should yield the same outcome if the untruncated U is unitary
         self.assertTrue(np.allclose(two_corners, two_corners_alg, rtol=1e-6, atol=1e-6))
 
+    def test_set_beta(self):
+        """
+        Test that setting beta gives the site tensors of the new beta and keeps the
+        corner and edge tensors.
+        """
+        alg = CtmAlg(beta=0.5, chi=self.chi, model=self.model)
+        alg.exe(max_steps=5)
+        C, T = alg.C, alg.T
+        alg.set_beta(0.4)
+        new = CtmAlg(beta=0.4, chi=self.chi, model=self.model)
+        for tensor in ["a", "b", "a_fixed", "b_fixed"]:
+            with self.subTest(tensor=tensor):
+                self.assertTrue(np.allclose(getattr(alg, tensor), getattr(new, tensor)))
+        with self.subTest():
+            self.assertTrue(alg.C is C and alg.T is T and alg.n_iter == 0)
+
+    def test_n_iter(self):
+        """
+        Test that the number of iterations counts the steps plus the initial sum of
+        singular values, also over consecutive executions.
+        """
+        alg = CtmAlg(beta=0.5, chi=self.chi, model=self.model)
+        alg.exe(tol=0, max_steps=5)
+        self.assertEqual(alg.n_iter, 6)
+        alg.exe(tol=0, max_steps=3)
+        self.assertEqual(alg.n_iter, 9)
+
+    def test_new_T_without_fixed(self):
+        """
+        Test that evaluating a new fixed edge tensor raises an error when the
+        algorithm has no fixed edge tensor.
+        """
+        with self.assertRaises(ValueError):
+            self.alg.new_T(self.U, fixed=True)
+
     def _test_increasing_chi(self):
         """
         Test that chi increases to the given chi for a system with boundary
@@ -179,7 +209,7 @@ class TestBlumeCtmAlg(TestIsingCtmAlg):
         self.M = self.alg.new_M()
         self.U, _ = self.alg.new_U(self.M)
         self.untrunc_U, _ = self.alg.new_U(self.M, False)
-        self.C = self.alg.new_C(self.U)
+        self.C = self.alg.new_C(self.U, self.M)
         self.T = self.alg.new_T(self.U)
 
 
@@ -1,8 +1,27 @@
 import unittest
+from unittest import mock
 import numpy as np
+import opt_einsum as oe
 
+from blume.model import post_props
 from blume.model.CTM_alg import CtmAlg
-from blume.model.post_props import Prop
+from blume.model.post_props import Prop, PATHS
+
+
+def alg_data(alg: CtmAlg) -> dict:
+    """
+    Return the data of the algorithm that the properties are computed from.
+    """
+    return {
+        "C": alg.C,
+        "T": alg.T,
+        "T_fixed": alg.T_fixed,
+        "beta": alg.beta,
+        "a": alg.a,
+        "a_fixed": alg.a_fixed,
+        "b": alg.b,
+        "b_fixed": alg.b_fixed,
+    }
 
 
 class TestPostProps(unittest.TestCase):
@@ -16,18 +35,7 @@ class TestPostProps(unittest.TestCase):
         alg.exe(tol=1e-7, count=10)
         self.assertAlmostEqual(
             m_known,
-            Prop.m(
-                {
-                    "C": alg.C,
-                    "T": alg.T,
-                    "T_fixed": alg.T_fixed,
-                    "beta": alg.beta,
-                    "a": alg.a,
-                    "a_fixed": alg.a_fixed,
-                    "b": alg.b,
-                    "b_fixed": alg.b_fixed,
-                }
-            ),
+            Prop.m(alg_data(alg)),
             places=6,
         )
 
@@ -41,18 +49,90 @@ class TestPostProps(unittest.TestCase):
         alg = CtmAlg(beta=beta_c, chi=12)
         alg.exe(tol=1e-9, count=10)
         self.assertAlmostEqual(
-            Prop.xi(
-                {
-                    "C": alg.C,
-                    "T": alg.T,
-                    "T_fixed": alg.T_fixed,
-                    "beta": alg.beta,
-                    "a": alg.a,
-                    "a_fixed": alg.a_fixed,
-                    "b": alg.b,
-                    "b_fixed": alg.b_fixed,
-                }
-            ),
+            Prop.xi(alg_data(alg)),
             cor_known,
             delta=20,
         )
+
+    def test_no_fixed_edges(self):
+        """
+        Test that the fixed properties raise an error for data without fixed edges.
+        """
+        alg = CtmAlg(beta=0.4, chi=4)
+        alg.exe(max_steps=10)
+        data = alg_data(alg)
+        for prop in [Prop.Z_fixed, Prop.m_fixed]:
+            with self.subTest(prop=prop.__name__):
+                with self.assertRaises(ValueError):
+                    prop(data)
+
+    def test_batch(self):
+        """
+        Test that a batch of datasets gives the same properties as the datasets
+        one by one.
+        """
+        datasets = []
+        for beta in [0.3, 0.4, 0.5]:
+            alg = CtmAlg(beta=beta, chi=4)
+            alg.exe(max_steps=20)
+            datasets.append(alg_data(alg))
+        batch = {
+            key: np.asarray([data[key] for data in datasets]) for key in datasets[0]
+        }
+
+        for prop in [Prop.Z, Prop.m, Prop.f, Prop.Es, Prop.xi, Prop.delta]:
+            with self.subTest(prop=prop.__name__):
+                self.assertTrue(
+                    np.allclose(prop(batch), [prop(data) for data in datasets]),
+                    f"Batched {prop.__name__} does not match the single datasets.",
+                )
+
+    def test_single_precision(self):
+        """
+        Test that the algorithm in single precision gives the same magnetization
+        close to the critical temperature as in double precision.
+        """
+        m = []
+        for dtype in [np.float64, np.float32]:
+            np.random.seed(0)
+            alg = CtmAlg(beta=0.45, chi=8, dtype=dtype)
+            alg.exe(tol=1e-6, count=10)
+            with self.subTest(dtype=dtype):
+                self.assertEqual(alg.C.dtype, dtype)
+            m.append(Prop.m(alg_data(alg)))
+        self.assertAlmostEqual(m[0], m[1], places=4)
+
+    def test_paths(self):
+        """
+        Test that the hardcoded contraction paths are the optimal paths for several
+        chi, d and batch sizes.
+        """
+        for model in ["ising", "blume"]:
+            for chi in [2, 5, 12]:
+                for batch in [1, 3]:
+                    alg = CtmAlg(beta=0.4, model=model, chi=chi)
+                    alg.exe(max_steps=3)
+                    data = alg_data(alg)
+                    if batch > 1:
+                        data = {
+                            key: np.asarray([val] * batch) for key, val in data.items()
+                        }
+
+                    # Record the networks and operand shapes that are contracted.
+                    with mock.patch.object(
+                        post_props, "expression", wraps=post_props.expression
+                    ) as expression:
+                        for prop in [Prop.Z, Prop.m, Prop.f, Prop.Es]:
+                            prop(data)
+
+                    calls = {call.args for call in expression.call_args_list}
+                    for subscripts, *shapes in calls:
+                        if subscripts not in PATHS:
+                            continue
+                        path, _ = oe.contract_path(
+                            subscripts, *shapes, shapes=True, optimize="optimal"
+                        )
+                        with self.subTest(
+                            model=model, chi=chi, batch=batch, subscripts=subscripts
+                        ):
+                            self.assertEqual(list(path), PATHS[subscripts])
@@ -2,15 +2,33 @@ import unittest
 from datetime import datetime
 import os
 import shutil
+import json
+import numpy as np
+from dataclasses import replace, FrozenInstanceError
 
-from blume.run import ModelParameters, Results
-from blume.process import read, compute
+from blume.run import ModelParameters, Results, encode
+from blume.process import (
+    read,
+    read_arrays,
+    compute,
+    compute_file,
+    compute_files,
+    compute_files_many,
+    compute_many,
+    plot_files,
+    to_arrays,
+    closest_indices,
+    decode,
+    build_ab,
+)
+from blume.model.CTM_alg import CtmAlg
+from blume.model.post_props import Prop
 
 
 class TestRun(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.now = datetime.now().strftime("%d-%m %H:%M")
+        cls.start = datetime.now()
         cls.chi_list = [2, 4]
         cls.max_steps_list = [4, 8]
 
@@ -24,30 +42,84 @@ class TestRun(unittest.TestCase):
         fixed_test.get(
             ModelParameters(var_range=[2.5, 2.7], b_c=True, fixed=True, bar=False)
         )
+        cls.now = chi_test.dir
+        cls.max_steps_dir = max_steps_test.dir
+        cls.fixed_dir = fixed_test.dir
+        cls.end = datetime.now()
 
     def test_new_folder(self):
         """
         Test that there is a new dir in `data` with the current datetime as
-        name.
+        name, and that every run gets its own dir.
         """
-        self.assertTrue(os.path.isdir(f"data/{TestRun.now}"))
+        dirs = [TestRun.now, TestRun.max_steps_dir, TestRun.fixed_dir]
+        for dir in dirs:
+            with self.subTest():
+                self.assertTrue(os.path.isdir(f"data/{dir}"))
+                created = datetime.strptime(dir.split("(")[0], "%Y%m%d-%H%M%S-%f")
+                self.assertTrue(TestRun.start <= created <= TestRun.end)
+        self.assertEqual(len(set(dirs)), len(dirs))
 
     def test_save(self):
         """
         Test that the data is saved in the new directory with the right name.
         """
+        # List every directory once instead of checking the files one by one.
+        max_steps_files = os.listdir(f"data/{TestRun.max_steps_dir}")
         for max_step in TestRun.max_steps_list:
             with self.subTest():
-                self.assertTrue(
-                    os.path.isfile(f"data/{TestRun.now}/max_steps{max_step}.json")
-                )
+                self.assertIn(f"max_steps{max_step}.json", max_steps_files)
 
+        chi_files = os.listdir(f"data/{TestRun.now}")
         for chi in TestRun.chi_list:
             with self.subTest():
-                self.assertTrue(os.path.isfile(f"data/{TestRun.now}/chi{chi}.json"))
+                self.assertIn(f"chi{chi}.json", chi_files)
 
         with self.subTest():
-            self.assertTrue(os.path.isfile(f"data/{TestRun.now}/data.json"))
+            self.assertIn("data.json", os.listdir(f"data/{TestRun.fixed_dir}"))
+
+    def test_parallel_sweep(self):
+        """
+        Test that sweeping in parallel gives the same data as sweeping serially.
+        """
+        params = ModelParameters(var_range=[2.5, 2.6, 2.7], b_c=True, bar=False)
+        serial = Results().sweep_var(params, "temperature")
+        params = replace(params, workers=2)
+        parallel = Results().sweep_var(params, "temperature")
+        for key in ["number of iterations", "temperatures", "converged corners"]:
+            with self.subTest(key=key):
+                self.assertTrue(np.array_equal(serial[key], parallel[key]))
+
+    def test_parallel_get(self):
+        """
+        Test that running the values of the varying parameter in parallel saves
+        the same data as running them serially.
+        """
+        params = ModelParameters(
+            var_range=[2.5, 2.6], b_c=True, use_prev=True, bar=False
+        )
+        serial, parallel = Results("chi", [2, 4]), Results("chi", [2, 4])
+        serial.get(params)
+        self.addCleanup(shutil.rmtree, f"data/{serial.dir}")
+        parallel.get(replace(params, workers=2))
+        self.addCleanup(shutil.rmtree, f"data/{parallel.dir}")
+        for chi in [2, 4]:
+            serial_data = read(serial.dir, f"chi{chi}")
+            parallel_data = read(parallel.dir, f"chi{chi}")
+            for key in ["number of iterations", "converged corners", "chi"]:
+                with self.subTest(chi=chi, key=key):
+                    self.assertEqual(serial_data[key], parallel_data[key])
+
+    def test_params_unchanged(self):
+        """
+        Test that sweeping does not change the given parameters, which are frozen.
+        """
+        params = ModelParameters(var_range=[2.5, 2.6], bar=False)
+        data = Results().sweep_var(params, "temperature")
+        self.assertEqual(params.temperature, 1)
+        self.assertEqual(data["temperature"], 2.6)
+        with self.assertRaises(FrozenInstanceError):
+            params.temperature = 2  # type: ignore
 
     def test_contents(self):
         """
@@ -63,20 +135,198 @@ class TestRun(unittest.TestCase):
             with self.subTest():
                 self.assertTrue(data["converged fixed edges"][1] == None)
 
-            for key in data:
-                if isinstance(data[key], list):
-                    # Check that the lists are not empty
-                    with self.subTest():
-                        self.assertFalse(data[key] == [])
+            # Check that the lists are not empty
+            for key in [key for key, val in data.items() if isinstance(val, list)]:
+                with self.subTest(key=key):
+                    self.assertTrue(data[key], f"{key} is empty")
 
-        data = read(TestRun.now, "data")
+        data = read(TestRun.fixed_dir, "data")
         # Check that it saves the fixed edges.
         with self.subTest():
             self.assertFalse(data["converged fixed edges"][1] == None)
 
+    def test_binary(self):
+        """
+        Test that the tensors are saved in the binary file and not in the json file.
+        """
+        for chi in TestRun.chi_list:
+            with np.load(f"data/{TestRun.now}/chi{chi}.npz") as arrays:
+                with self.subTest():
+                    self.assertIn("converged corners", arrays.files)
+            with open(f"data/{TestRun.now}/chi{chi}.json") as fp:
+                with self.subTest():
+                    self.assertNotIn("converged corners", json.load(fp))
+
+    def test_build_ab(self):
+        """
+        Test that the a and b tensors are not saved, but built from the parameters
+        with the same values as the tensors of the algorithm.
+        """
+        data = read(TestRun.now, f"chi{TestRun.chi_list[0]}")
+        self.assertNotIn("a tensors", data)
+        temps = data["temperatures"]
+        ab = build_ab(temps, "ising", [1] * len(temps), [0] * len(temps))
+        for i, temp in enumerate(temps):
+            alg = CtmAlg(1 / temp)
+            for key in ["a", "a_fixed", "b", "b_fixed"]:
+                with self.subTest():
+                    np.testing.assert_array_equal(
+                        ab[f"{key} tensors"][i], getattr(alg, key)
+                    )
+
+    def test_compute_temperatures_only(self):
+        """
+        Test that computing a property only needs the temperatures of the sweep,
+        not the temperature parameter.
+        """
+        data = read(TestRun.now, f"chi{TestRun.chi_list[0]}")
+        m = compute(Prop.m, data)
+        del data["temperature"]
+        self.assertEqual(compute(Prop.m, data), m)
+
+    def test_encode(self):
+        """
+        Test that arrays encoded in the json file are decoded to the same values.
+        """
+        arrays = [
+            np.array([[1.0, np.nan], [np.inf, -2.5]]),
+            np.arange(6).reshape(3, 2).T,
+        ]
+        for array in arrays:
+            decoded = decode(json.loads(json.dumps(encode(array))))
+            with self.subTest():
+                np.testing.assert_array_equal(decoded, array)
+                self.assertEqual(decoded.dtype, array.dtype)
+
+    def test_compute_files(self):
+        """
+        Test that computing a property for several files in parallel gives the
+        same result as computing them one by one.
+        """
+        fns = [f"chi{chi}" for chi in TestRun.chi_list]
+        parallel = compute_files(Prop.m, TestRun.now, fns, workers=2)
+        for fn, m in zip(fns, parallel):
+            with self.subTest():
+                self.assertEqual(m, compute(Prop.m, read(TestRun.now, fn)))
+
+    def test_compute_files_many(self):
+        """
+        Test that computing several properties for several files in parallel gives
+        the same results as computing them per file.
+        """
+        fns = [f"chi{chi}" for chi in TestRun.chi_list]
+        props = [Prop.m, Prop.f]
+        parallel = compute_files_many(props, TestRun.now, fns, workers=2)
+        for fn, ys in zip(fns, parallel):
+            with self.subTest():
+                self.assertEqual(ys, compute_many(props, read(TestRun.now, fn)))
+
+    def test_compute_many(self):
+        """
+        Test that computing several properties at once gives the same results as
+        computing them separately.
+        """
+        data = read(TestRun.now, f"chi{TestRun.chi_list[0]}")
+        props = [Prop.Z, Prop.m, Prop.f, Prop.Es]
+        for prop, y in zip(props, compute_many(props, data)):
+            with self.subTest(prop=prop.__name__):
+                self.assertEqual(y, compute(prop, data))
+
+    def test_to_arrays(self):
+        """
+        Test that computing a property from the converted data gives the same
+        result as computing it from the data that was read.
+        """
+        data = read(TestRun.now, f"chi{TestRun.chi_list[0]}")
+        arrays = to_arrays(data)
+        with self.subTest():
+            self.assertIsInstance(arrays["converged corners"], np.ndarray)
+        with self.subTest():
+            self.assertEqual(compute(Prop.m, arrays), compute(Prop.m, data))
+
+    def test_read_arrays(self):
+        """
+        Test that the converted data is cached and holds the same values as the
+        data that was read.
+        """
+        fn = f"chi{TestRun.chi_list[0]}"
+        arrays = read_arrays(TestRun.now, fn)
+        with self.subTest():
+            self.assertIs(arrays, read_arrays(TestRun.now, fn))
+        with self.subTest():
+            self.assertEqual(
+                arrays["converged edges"].tolist(),
+                read(TestRun.now, fn)["converged edges"],
+            )
+
+    def test_read_arrays_npz(self):
+        """
+        Test that the cached data is read again when only the binary file changes.
+        """
+        src = f"data/{TestRun.now}/chi{TestRun.chi_list[0]}"
+        folder = f"{TestRun.now}-npz"
+        os.makedirs(f"data/{folder}")
+        self.addCleanup(shutil.rmtree, f"data/{folder}")
+        shutil.copy(f"{src}.json", f"data/{folder}/data.json")
+        shutil.copy(f"{src}.npz", f"data/{folder}/data.npz")
+        corners = read_arrays(folder, "data")["converged corners"]
+
+        with np.load(f"data/{folder}/data.npz") as arrays:
+            tensors = {key: arrays[key] for key in arrays.files}
+        tensors["converged corners"] = 2 * tensors["converged corners"]
+        np.savez_compressed(f"data/{folder}/data.npz", **tensors)
+        # Make sure the modification time differs, also on coarse filesystems.
+        mtime = os.path.getmtime(f"data/{folder}/data.npz") + 10
+        os.utime(f"data/{folder}/data.npz", (mtime, mtime))
+
+        np.testing.assert_array_equal(
+            read_arrays(folder, "data")["converged corners"], 2 * corners
+        )
+
+    def test_compute_file(self):
+        """
+        Test that computing a property for a file gives the same result as
+        computing it from the data that was read, also when it is cached.
+        """
+        fn = f"chi{TestRun.chi_list[0]}"
+        m = compute(Prop.m, read(TestRun.now, fn))
+        for _ in range(2):
+            with self.subTest():
+                self.assertEqual(compute_file(Prop.m, TestRun.now, fn), m)
+
+    def test_plot_files(self):
+        """
+        Test that every property is plotted in its own figure, with a line per
+        file.
+        """
+        fns = [f"chi{chi}" for chi in TestRun.chi_list]
+        props = [Prop.m, "number of iterations"]
+        lines = plot_files(fns, (2.5, 2.6), props, TestRun.now)
+        with self.subTest():
+            self.assertNotEqual(lines[props[0]][0].figure, lines[props[1]][0].figure)
+        for fn, line in zip(fns, lines[Prop.m]):
+            with self.subTest(fn=fn):
+                m = compute(Prop.m, read(TestRun.now, fn))
+                self.assertEqual(list(line.get_ydata()), m[: len(line.get_ydata())])
+
+    def test_closest_indices(self):
+        """
+        Test that the indices of the values closest to the targets are found, for
+        sorted and unsorted values.
+        """
+        for temps in [[1.0, 1.5, 2.0, 2.5, 3.0], [2.5, 1.0, 3.0, 1.5, 2.0]]:
+            targets = [0.2, 1.2, 1.3, 2.9, 4.0]
+            expected = [
+                temps.index(min(temps, key=lambda x: abs(x - target)))
+                for target in targets
+            ]
+            with self.subTest(temps=temps):
+                self.assertEqual(list(closest_indices(temps, targets)), expected)
+
     @classmethod
     def tearDownClass(cls):
         """
-        Remove the new directory after all tests.
+        Remove the new directories after all tests.
         """
-        shutil.rmtree(f"data/{cls.now}")
+        for dir in [cls.now, cls.max_steps_dir, cls.fixed_dir]:
+            shutil.rmtree(f"data/{dir}")
@@ -1,4 +1,4 @@
-from blume.model.tensors import Tensors
+from blume.model.tensors import Tensors, Methods, cached_tensors
 
 import unittest
 import numpy as np
@@ -13,26 +13,74 @@ class TestIsingTensors(unittest.TestCase):
         """
         shapes = [(2, 2), (4, 4), (2, 2, 2), (3, 3, 3), (2, 2, 2, 2)]
         for shape in shapes:
-            delta = Tensors.delta(shape)
-            adj_delta = Tensors.delta(shape, adj=True)
-            for index in np.ndindex(shape):
-                with self.subTest():
-                    # If all indices are the same.
-                    if index.count(index[0]) == len(index):
-                        self.assertEqual(delta[index], 1, f"delta({index}) should be 1")
-                    else:
-                        self.assertEqual(delta[index], 0, f"delta({index}) should be 0")
-
-                with self.subTest():
-                    # If all indices are 0.
-                    if index.count(0) == len(index):
-                        self.assertEqual(
-                            adj_delta[index], 1, f"adj_delta({index}) should be 1"
-                        )
-                    else:
-                        self.assertEqual(
-                            adj_delta[index], 0, f"adj_delta({index}) should be 0"
-                        )
+            # All indices are equal on the diagonal and all are 0 for the first
+            # element, compare the full tensors at once.
+            index = np.indices(shape)
+            diagonal = np.all(index == index[0], axis=0)
+            first = np.all(index == 0, axis=0)
+            with self.subTest(shape=shape):
+                self.assertTrue(
+                    np.array_equal(Tensors.delta(shape), diagonal),
+                    f"delta{shape} is not 1 for only equal indices",
+                )
+            with self.subTest(shape=shape):
+                self.assertTrue(
+                    np.array_equal(Tensors.delta(shape, adj=True), first),
+                    f"adj_delta{shape} is not 1 for only zero indices",
+                )
+
+    def test_Q(self):
+        """
+        Test that Q is a real symmetric square root of the Boltzmann weights.
+        """
+        Q, beta = self.tensors.Q, self.tensors.beta
+        with self.subTest():
+            self.assertTrue(np.isrealobj(Q), "Q is not real")
+        with self.subTest():
+            self.assertTrue(np.allclose(Q, Q.T), "Q is not symmetric")
+
+        # Equal and opposite outer spins.
+        M = Q @ Q
+        with self.subTest():
+            self.assertAlmostEqual(M[0, 0], np.exp(beta))
+            self.assertAlmostEqual(M[-1, -1], np.exp(beta))
+            self.assertAlmostEqual(M[0, -1], np.exp(-beta))
+
+    def test_weights(self):
+        """
+        Test that the weights are the diagonal of the (coupling) delta tensor.
+        """
+        d = self.tensors.d
+        for adj in [False, True]:
+            delta = (
+                Tensors.delta((d, d, d, d), adj)
+                if self.tensors.model == "ising"
+                else self.tensors.coupling_delta(4, adj)
+            )
+            i = np.arange(d)
+            with self.subTest(adj=adj):
+                self.assertTrue(
+                    np.array_equal(self.tensors.weights(adj), delta[i, i, i, i])
+                )
+
+    def test_coupling_delta(self):
+        """
+        Test that the coupling delta tensor holds the Boltzmann factors of the
+        spins on its diagonal, for both models.
+        """
+        t = self.tensors
+        factors = [
+            np.exp(-t.beta * (t.coupling + t.h)),
+            1,
+            np.exp(-t.beta * (t.coupling - t.h)),
+        ][: t.d]
+        i = np.arange(t.d)
+        for adj in [False, True]:
+            expected = factors[:1] + [0] * (t.d - 1) if adj else factors
+            with self.subTest(adj=adj):
+                self.assertTrue(
+                    np.allclose(t.coupling_delta(4, adj)[i, i, i, i], expected)
+                )
 
     def test_random(self):
         """
@@ -49,6 +97,40 @@ class TestIsingTensors(unittest.TestCase):
                 )
                 self.assertTrue((0 <= c.all() <= 1), "Values are not normalized")
 
+    def test_symmetrize(self):
+        """
+        Test that symmetrizing in place gives the same symmetric tensor, and that
+        integer arrays are symmetrized into a float array.
+        """
+        for shape in [(4, 4), (4, 4, 3)]:
+            M = np.random.uniform(size=shape)
+            symmetric = Methods.symmetrize(M)
+            with self.subTest(shape=shape):
+                self.assertTrue(np.allclose(symmetric, np.swapaxes(symmetric, 0, 1)))
+            with self.subTest(shape=shape):
+                self.assertTrue(np.allclose(Methods.symmetrize(M, out=M), symmetric))
+
+        # Integer arrays give the float average.
+        M = np.arange(4).reshape(2, 2)
+        self.assertTrue(
+            np.array_equal(Methods.symmetrize(M), np.array([[0, 1.5], [1.5, 3]]))
+        )
+
+    def test_normalize(self):
+        """
+        Test that normalizing divides by the largest absolute value, also when it
+        is the value of a negative element.
+        """
+        for M in [
+            np.array([[1.0, -4.0], [2.0, 0.5]]),
+            np.random.uniform(size=(4, 4, 3)),
+        ]:
+            expected = M / np.max(np.abs(M))
+            with self.subTest():
+                self.assertTrue(np.array_equal(Methods.normalize(M), expected))
+            with self.subTest():
+                self.assertTrue(np.array_equal(Methods.normalize(M, out=M), expected))
+
     def _test_a(self):
         """
         Test that the a tensor equals the theoretical tensor.
@@ -91,6 +173,18 @@ class TestIsingTensors(unittest.TestCase):
             "The computed lattice tensor `b` does not agree with the theoretical tensor.",
         )
 
+    def test_cache(self):
+        """
+        Test that the tensors are built once and can not be modified.
+        """
+        tensors = cached_tensors(0.5, self.tensors.model)
+        with self.subTest():
+            self.assertIs(tensors, cached_tensors(0.5, self.tensors.model))
+        with self.subTest():
+            self.assertIs(tensors.a(), tensors.a())
+        with self.subTest():
+            self.assertFalse(tensors.b(adj=True).flags.writeable)
+
     def test_C_init(self):
         """
         Test the shape of C_init.